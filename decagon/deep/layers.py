@@ -31,6 +31,17 @@ def dropout_sparse(x, keep_prob, num_nonzero_elems):
     return pre_out * (1./keep_prob)
 
 
+def dropout_rows(x, keep_prob, num_rows):
+    """Row-wise dropout for a dense tensor. Equivalent to dropout_sparse
+    on identity features followed by multiplication with x.
+    """
+    noise_shape = [num_rows, 1]
+    random_tensor = keep_prob
+    random_tensor += tf.random_uniform(noise_shape)
+    dropout_mask = tf.floor(random_tensor)
+    return x * dropout_mask * (1./keep_prob)
+
+
 class MultiLayer(object):
     """Base layer class. Defines basic API for all layer objects.
 
@@ -68,15 +79,23 @@ class MultiLayer(object):
 
 
 class GraphConvolutionSparseMulti(MultiLayer):
-    """Graph convolution layer for sparse inputs."""
+    """Graph convolution layer for sparse inputs.
+
+    With use_identity_feat=False the one-hot input features are left
+    implicit: feat @ W reduces to W itself, so the layer reads its weight
+    rows directly instead of running a sparse matmul against an identity
+    matrix fed from outside.
+    """
     def __init__(self, input_dim, output_dim, adj_mats,
-                 nonzero_feat, dropout=0., act=tf.nn.relu, **kwargs):
+                 nonzero_feat, use_identity_feat=True,
+                 dropout=0., act=tf.nn.relu, **kwargs):
         super(GraphConvolutionSparseMulti, self).__init__(**kwargs)
         self.dropout = dropout
         self.adj_mats = adj_mats
         self.act = act
         self.issparse = True
         self.nonzero_feat = nonzero_feat
+        self.use_identity_feat = use_identity_feat
         with tf.variable_scope('%s_vars' % self.name):
             for k in range(self.num_types):
                 self.vars['weights_%d' % k] = inits.weight_variable_glorot(
@@ -85,8 +104,12 @@ class GraphConvolutionSparseMulti(MultiLayer):
     def _call(self, inputs):
         outputs = []
         for k in range(self.num_types):
-            x = dropout_sparse(inputs, 1-self.dropout, self.nonzero_feat[self.edge_type[1]])
-            x = tf.sparse_tensor_dense_matmul(x, self.vars['weights_%d' % k])
+            if self.use_identity_feat:
+                x = dropout_sparse(inputs, 1-self.dropout, self.nonzero_feat[self.edge_type[1]])
+                x = tf.sparse_tensor_dense_matmul(x, self.vars['weights_%d' % k])
+            else:
+                x = dropout_rows(self.vars['weights_%d' % k], 1-self.dropout,
+                                 self.nonzero_feat[self.edge_type[1]])
             x = tf.sparse_tensor_dense_matmul(self.adj_mats[self.edge_type][k], x)
             outputs.append(self.act(x))
         outputs = tf.add_n(outputs)
@@ -28,14 +28,18 @@ class EdgeMinibatchIterator(object):
         self.freebatch_edge_types= list(range(self.num_edge_types))
         self.batch_num = [0]*self.num_edge_types
         self.current_edge_type_idx = 0
+        # Flattened (i, j, k, rows, cols) schema of every edge type, in the
+        # same order the placeholders are constructed. Indexed access into
+        # this record array replaces repeated nested dict walks.
+        self.edge_schema = np.array(
+            [(i, j, k) + self.adj_mats[i, j][k].shape
+             for i, j in self.edge_types for k in range(self.edge_types[i, j])],
+            dtype=[('i', 'i4'), ('j', 'i4'), ('k', 'i4'), ('r', 'i4'), ('c', 'i4')])
         self.edge_type2idx = {}
         self.idx2edge_type = {}
-        r = 0
-        for i, j in self.edge_types:
-            for k in range(self.edge_types[i,j]):
-                self.edge_type2idx[i, j, k] = r
-                self.idx2edge_type[r] = i, j, k
-                r += 1
+        for r, (i, j, k, _, _) in enumerate(self.edge_schema):
+            self.edge_type2idx[int(i), int(j), int(k)] = r
+            self.idx2edge_type[r] = int(i), int(j), int(k)
 
         self.train_edges = {edge_type: [None]*n for edge_type, n in self.edge_types.items()}
         self.val_edges = {edge_type: [None]*n for edge_type, n in self.edge_types.items()}
@@ -77,6 +81,8 @@ class EdgeMinibatchIterator(object):
 
     def mask_test_edges(self, edge_type, type_idx):
         edges_all, _, _ = preprocessing.sparse_to_tuple(self.adj_mats[edge_type][type_idx])
+        # (E, 2) int32 arrays allow direct fancy indexing during evaluation
+        edges_all = edges_all.astype(np.int32, copy=False)
         num_test = max(50, int(np.floor(edges_all.shape[0] * self.val_test_size)))
         num_val = max(50, int(np.floor(edges_all.shape[0] * self.val_test_size)))
 
@@ -118,7 +124,7 @@ class EdgeMinibatchIterator(object):
             val_edges_false.append([idx_i, idx_j])
 
         # Re-build adj matrices
-        data = np.ones(train_edges.shape[0])
+        data = np.ones(train_edges.shape[0], dtype=np.float32)
         adj_train = sp.csr_matrix(
             (data, (train_edges[:, 0], train_edges[:, 1])),
             shape=self.adj_mats[edge_type][type_idx].shape)
@@ -126,9 +132,9 @@ class EdgeMinibatchIterator(object):
 
         self.train_edges[edge_type][type_idx] = train_edges
         self.val_edges[edge_type][type_idx] = val_edges
-        self.val_edges_false[edge_type][type_idx] = np.array(val_edges_false)
+        self.val_edges_false[edge_type][type_idx] = np.array(val_edges_false, dtype=np.int32)
         self.test_edges[edge_type][type_idx] = test_edges
-        self.test_edges_false[edge_type][type_idx] = np.array(test_edges_false)
+        self.test_edges_false[edge_type][type_idx] = np.array(test_edges_false, dtype=np.int32)
 
     def end(self):
         finished = len(self.freebatch_edge_types) == 0
@@ -138,8 +144,9 @@ class EdgeMinibatchIterator(object):
         # construct feed dictionary
         feed_dict.update({
             placeholders['adj_mats_%d,%d,%d' % (i,j,k)]: self.adj_train[i,j][k]
-            for i, j in self.edge_types for k in range(self.edge_types[i,j])})
-        feed_dict.update({placeholders['feat_%d' % i]: self.feat[i] for i, _ in self.edge_types})
+            for i, j, k, _, _ in self.edge_schema})
+        feed_dict.update({placeholders['feat_%d' % i]: self.feat[i]
+                          for i, _ in self.edge_types if self.feat[i] is not None})
         feed_dict.update({placeholders['dropout']: dropout})
 
         return feed_dict
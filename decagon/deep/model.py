@@ -45,7 +45,8 @@ class Model(object):
 
 
 class DecagonModel(Model):
-    def __init__(self, placeholders, num_feat, nonzero_feat, edge_types, decoders, **kwargs):
+    def __init__(self, placeholders, num_feat, nonzero_feat, edge_types, decoders,
+                 use_identity_feat=True, **kwargs):
         super(DecagonModel, self).__init__(**kwargs)
         self.edge_types = edge_types
         self.num_edge_types = sum(self.edge_types.values())
@@ -54,6 +55,7 @@ class DecagonModel(Model):
         self.inputs = {i: placeholders['feat_%d' % i] for i, _ in self.edge_types}
         self.input_dim = num_feat
         self.nonzero_feat = nonzero_feat
+        self.use_identity_feat = use_identity_feat
         self.placeholders = placeholders
         self.dropout = placeholders['dropout']
         self.adj_mats = {et: [
@@ -68,6 +70,7 @@ class DecagonModel(Model):
                 input_dim=self.input_dim, output_dim=FLAGS.hidden1,
                 edge_type=(i,j), num_types=self.edge_types[i,j],
                 adj_mats=self.adj_mats, nonzero_feat=self.nonzero_feat,
+                use_identity_feat=self.use_identity_feat,
                 act=lambda x: x, dropout=self.dropout,
                 logging=self.logging)(self.inputs[j]))
 
@@ -21,6 +21,7 @@ def sparse_to_tuple(sparse_mx):
     if not sp.isspmatrix_coo(sparse_mx):
         sparse_mx = sparse_mx.tocoo()
     coords = np.vstack((sparse_mx.row, sparse_mx.col)).transpose()
-    values = sparse_mx.data
+    # tf placeholders are float32; cast here so the feed is zero-copy
+    values = sparse_mx.data.astype(np.float32, copy=False)
     shape = sparse_mx.shape
     return coords, values, shape
\ No newline at end of file
@@ -1,16 +1,19 @@
 from __future__ import division
 from __future__ import print_function
-from operator import itemgetter
-from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
 import time
 import os
-import random
+import multiprocessing
+import threading
+
+from six.moves import queue
 
 import pandas as pd
 import tensorflow as tf
 import numpy as np
 import networkx as nx
 import scipy.sparse as sp
+from scipy.special import expit
 from sklearn import metrics
 
 from decagon.deep.optimizer import DecagonOptimizer
@@ -35,22 +38,46 @@ np.random.seed(0)
 #
 ###########################################################
 
-def load_decagon_data(use_dummy=False, ppi_path='polypharmacy/bio-decagon-ppi.csv', 
+def _identity_tuple(n):
+    """Sparse tuple of an n x n identity, without going through scipy."""
+    idx = np.arange(n, dtype=np.int64)
+    coords = np.stack([idx, idx], axis=1)
+    return coords, np.ones(n, dtype=np.float32), (n, n)
+
+def _build_se_adj(args):
+    """Materialize one symmetric side-effect CSR from its (row, col) bucket."""
+    (r, c), n_drugs = args
+    r = np.asarray(r)
+    c = np.asarray(c)
+    rows = np.concatenate([r, c])  # symmetric
+    cols = np.concatenate([c, r])
+    return sp.csr_matrix(
+        (np.ones(rows.shape[0], dtype=np.float32), (rows, cols)),
+        shape=(n_drugs, n_drugs))
+
+def load_decagon_data(use_dummy=False, use_identity_feat=False,
+                     ppi_path='polypharmacy/bio-decagon-ppi.csv',
                      drug_target_path='polypharmacy/bio-decagon-targets-all.csv',
                      combo_path='polypharmacy/bio-decagon-combo.csv'):
     """
     Load and preprocess data for Decagon model from the bio-decagon datasets.
-    
+
     Args:
         use_dummy: If True, use synthetic dummy data. If False, load real data.
+        use_identity_feat: If True, materialize identity feature matrices and
+            feed them as sparse inputs. If False, features stay implicit and
+            the model reads its input-layer weights directly.
         ppi_path: Path to protein-protein interaction CSV file
         drug_target_path: Path to drug-target interaction CSV file
         combo_path: Path to drug-drug interaction CSV file
-    
+
     Returns:
         Processed data in the format expected by Decagon
     """
-    
+    # Dedicated generator keeps the synthetic data deterministic without
+    # touching the global np.random state
+    rng = np.random.RandomState(0)
+
     if use_dummy:
         # Use the synthetic dummy data
         val_test_size = 0.05
@@ -59,21 +86,26 @@ def load_decagon_data(use_dummy=False, ppi_path='polypharmacy/bio-decagon-ppi.cs
         n_drugdrug_rel_types = 1317
         gene_net = nx.planted_partition_graph(360, 53, 0.1, 0.01, seed=42)
         gene_adj = nx.adjacency_matrix(gene_net)
-        gene_degrees = np.array(gene_adj.sum(axis=0)).squeeze()
-        gene_drug_adj = sp.csr_matrix((10 * np.random.randn(n_genes, n_drugs) > 15).astype(int))
-        drug_gene_adj = gene_drug_adj.transpose(copy=True)
+        gene_degrees = gene_adj.getnnz(axis=0).astype(np.int32)
+        gene_drug_adj = sp.csr_matrix((10 * rng.randn(n_genes, n_drugs) > 15).astype(np.float32))
+        drug_gene_adj = gene_drug_adj.T.tocsr()
         drug_drug_adj_list = []
-        tmp = np.dot(drug_gene_adj, gene_drug_adj)
-        
+
+        # Upper-triangle pair coordinates are the same for every side effect type
+        iu, ju = np.triu_indices(n_drugs, k=1)
+        n_pairs = iu.shape[0]
         for i in range(n_drugdrug_rel_types):
             if i % 15 == 0:
                 print("Round %d with side effect %s" % (i, i))
-            mat = np.zeros((n_drugs, n_drugs))
-            for d1, d2 in combinations(list(range(n_drugs)), 2):
-                if random.randint(0, 1000) < 3:
-                    mat[d1, d2] = mat[d2, d1] = 1.
-            drug_drug_adj_list.append(sp.csr_matrix(mat))
-        drug_degrees_list = [np.array(drug_adj.sum(axis=0)).squeeze() for drug_adj in drug_drug_adj_list]
+            mask = rng.random_sample(n_pairs) < 3. / 1001
+            rows = iu[mask]
+            cols = ju[mask]
+            mat = sp.coo_matrix(
+                (np.ones(2 * rows.shape[0], dtype=np.float32),
+                 (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+                shape=(n_drugs, n_drugs))
+            drug_drug_adj_list.append(mat.tocsr())
+        drug_degrees_list = [np.asarray(drug_adj.getnnz(axis=0), dtype=np.int32) for drug_adj in drug_drug_adj_list]
         
     else:
         # Load real data from the CSV files
@@ -83,7 +115,7 @@ def load_decagon_data(use_dummy=False, ppi_path='polypharmacy/bio-decagon-ppi.cs
         ppi_network, gene2idx = load_ppi(ppi_path)
         n_genes = len(gene2idx)
         gene_adj = nx.adjacency_matrix(ppi_network)
-        gene_degrees = np.array(gene_adj.sum(axis=0)).squeeze()
+        gene_degrees = gene_adj.getnnz(axis=0).astype(np.int32)
         
         print("Loading Drug-Target Interactions...")
         drug2proteins = load_targets(drug_target_path)
@@ -113,61 +145,77 @@ def load_decagon_data(use_dummy=False, ppi_path='polypharmacy/bio-decagon-ppi.cs
         
         print("Number of unique side effect types: %d" % n_se_types)
         
-        # Create drug-gene adjacency matrix (n_drugs x n_genes)
-        gene_drug_adj = sp.lil_matrix((n_genes, n_drugs))
+        # Create gene-drug adjacency matrix (n_genes x n_drugs) directly in
+        # CSR from coordinate arrays; LIL scalar assignment is far slower.
+        rows = []
+        cols = []
         for drug, proteins in drug2proteins.items():
-            if drug in drug2idx:
-                drug_idx = drug2idx[drug]
-                for protein in proteins:
-                    if protein in gene2idx:
-                        gene_idx = gene2idx[protein]
-                        gene_drug_adj[gene_idx, drug_idx] = 1
+            if drug not in drug2idx:
+                continue
+            drug_idx = drug2idx[drug]
+            for protein in proteins:
+                gene_idx = gene2idx.get(protein)
+                if gene_idx is not None:
+                    rows.append(gene_idx)
+                    cols.append(drug_idx)
+
+        gene_drug_adj = sp.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (np.asarray(rows), np.asarray(cols))),
+            shape=(n_genes, n_drugs))
+        drug_gene_adj = gene_drug_adj.T.tocsr()
         
-        gene_drug_adj = gene_drug_adj.tocsr()
-        drug_gene_adj = gene_drug_adj.transpose(copy=True)
-        
-        # Create drug-drug adjacency matrices for each side effect type
-        drug_drug_adj_list = []
-        count = 0
-        for se in unique_se:
-            count += 1
-            if count % 15 == 0:
-                print("Round %d with side effect %s" % (count, se))
-            mat = sp.lil_matrix((n_drugs, n_drugs))
-            for combo, se_set in drug2se.items():
-                if se in se_set:
-                    drug1, drug2 = drug2drug[combo]
-                    if drug1 in drug2idx and drug2 in drug2idx:
-                        d1_idx = drug2idx[drug1]
-                        d2_idx = drug2idx[drug2]
-                        mat[d1_idx, d2_idx] = 1
-                        mat[d2_idx, d1_idx] = 1  # symmetric
-            drug_drug_adj_list.append(mat.tocsr())
+        # Create drug-drug adjacency matrices for each side effect type.
+        # One linear pass over the combos buckets the (row, col) indices per
+        # side effect; each CSR is then built directly from the index arrays.
+        buckets = {se: ([], []) for se in unique_se}
+        for combo, se_set in drug2se.items():
+            drug1, drug2 = drug2drug[combo]
+            if drug1 not in drug2idx or drug2 not in drug2idx:
+                continue
+            d1_idx = drug2idx[drug1]
+            d2_idx = drug2idx[drug2]
+            for se in se_set:
+                buckets[se][0].append(d1_idx)
+                buckets[se][1].append(d2_idx)
+
+        # Each side effect's CSR is independent of the others, so fan the
+        # materialization out across processes, chunked to amortize IPC.
+        with ProcessPoolExecutor() as executor:
+            drug_drug_adj_list = list(executor.map(
+                _build_se_adj, [(buckets[se], n_drugs) for se in unique_se],
+                chunksize=32))
         
-        drug_degrees_list = [np.array(adj.sum(axis=0)).squeeze() for adj in drug_drug_adj_list]
+        drug_degrees_list = [np.asarray(adj.getnnz(axis=0), dtype=np.int32) for adj in drug_drug_adj_list]
     
     # Prepare data representation (same for both dummy and real data)
     val_test_size = 0.05
     
     adj_mats_orig = {
-        (0, 0): [gene_adj, gene_adj.transpose(copy=True)],
+        # The PPI network is undirected, so gene_adj equals its transpose
+        (0, 0): [gene_adj, gene_adj],
         (0, 1): [gene_drug_adj],
         (1, 0): [drug_gene_adj],
-        (1, 1): drug_drug_adj_list + [x.transpose(copy=True) for x in drug_drug_adj_list],
+        # Each drug-drug matrix is symmetric, so the reverse direction can
+        # share the same CSR objects instead of transposing 1317 copies
+        (1, 1): drug_drug_adj_list + drug_drug_adj_list,
     }
     degrees = {
         0: [gene_degrees, gene_degrees],
         1: drug_degrees_list + drug_degrees_list,
     }
     
-    # Generate features (identity matrices)
-    gene_feat = sp.identity(n_genes)
-    gene_nonzero_feat, gene_num_feat = gene_feat.shape
-    gene_feat = preprocessing.sparse_to_tuple(gene_feat.tocoo())
-    
-    drug_feat = sp.identity(n_drugs)
-    drug_nonzero_feat, drug_num_feat = drug_feat.shape
-    drug_feat = preprocessing.sparse_to_tuple(drug_feat.tocoo())
+    # Generate features (identity matrices). With implicit features the
+    # identity is never materialized; only the dimensions are recorded.
+    if use_identity_feat:
+        gene_feat = _identity_tuple(n_genes)
+        gene_nonzero_feat = gene_num_feat = n_genes
+
+        drug_feat = _identity_tuple(n_drugs)
+        drug_nonzero_feat = drug_num_feat = n_drugs
+    else:
+        gene_feat = drug_feat = None
+        gene_nonzero_feat = gene_num_feat = n_genes
+        drug_nonzero_feat = drug_num_feat = n_drugs
     
     num_feat = {
         0: gene_num_feat,
@@ -196,43 +244,61 @@ def load_decagon_data(use_dummy=False, ppi_path='polypharmacy/bio-decagon-ppi.cs
     
     return val_test_size, adj_mats_orig, degrees, num_feat, nonzero_feat, feat, edge_type2dim, edge_type2decoder, edge_types, num_edge_types
 
-def get_accuracy_scores(edges_pos, edges_neg, edge_type):
+def fetch_prediction_factors():
+    """Fetch node embeddings and decoder factors in a single session launch.
+
+    The returned triple lets get_accuracy_scores reconstruct the prediction
+    matrix of any edge type on the host, so evaluating all edge types costs
+    one session launch instead of one per edge type.
+    """
     feed_dict.update({placeholders['dropout']: 0})
-    feed_dict.update({placeholders['batch_edge_type_idx']: minibatch.edge_type2idx[edge_type]})
-    feed_dict.update({placeholders['batch_row_edge_type']: edge_type[0]})
-    feed_dict.update({placeholders['batch_col_edge_type']: edge_type[1]})
-    rec = sess.run(opt.predictions, feed_dict=feed_dict)
-
-    def sigmoid(x):
-        return 1. / (1 + np.exp(-x))
-
-    # Predict on test set of edges
-    preds = []
-    actual = []
-    predicted = []
-    edge_ind = 0
-    for u, v in edges_pos[edge_type[:2]][edge_type[2]]:
-        score = sigmoid(rec[u, v])
-        preds.append(score)
-        assert adj_mats_orig[edge_type[:2]][edge_type[2]][u,v] == 1, 'Problem 1'
-
-        actual.append(edge_ind)
-        predicted.append((score, edge_ind))
-        edge_ind += 1
-
-    preds_neg = []
-    for u, v in edges_neg[edge_type[:2]][edge_type[2]]:
-        score = sigmoid(rec[u, v])
-        preds_neg.append(score)
-        assert adj_mats_orig[edge_type[:2]][edge_type[2]][u,v] == 0, 'Problem 0'
-
-        predicted.append((score, edge_ind))
-        edge_ind += 1
-
-    preds_all = np.hstack([preds, preds_neg])
-    preds_all = np.nan_to_num(preds_all)
-    labels_all = np.hstack([np.ones(len(preds)), np.zeros(len(preds_neg))])
-    predicted = list(zip(*sorted(predicted, reverse=True, key=itemgetter(0))))[1]
+    return sess.run([model.embeddings, opt.latent_inters, opt.latent_varies],
+                    feed_dict=feed_dict)
+
+def get_accuracy_scores(edges_pos, edges_neg, edge_type, factors=None):
+    ep = np.asarray(edges_pos[edge_type[:2]][edge_type[2]])
+    en = np.asarray(edges_neg[edge_type[:2]][edge_type[2]])
+
+    if factors is None:
+        feed_dict.update({placeholders['dropout']: 0})
+        feed_dict.update({placeholders['batch_edge_type_idx']: minibatch.edge_type2idx[edge_type]})
+        feed_dict.update({placeholders['batch_row_edge_type']: edge_type[0]})
+        feed_dict.update({placeholders['batch_col_edge_type']: edge_type[1]})
+        rec = sess.run(opt.predictions, feed_dict=feed_dict)
+        preds = expit(rec[ep[:, 0], ep[:, 1]])
+        preds_neg = expit(rec[en[:, 0], en[:, 1]])
+    else:
+        # Score only the evaluated edges from the pre-fetched factors,
+        # mirroring DecagonOptimizer.predict (row_emb @ D @ R @ D @ col_emb^T)
+        # without materializing the full prediction matrix
+        embeddings, latent_inters, latent_varies = factors
+        idx = minibatch.edge_type2idx[edge_type]
+        kernel = latent_varies[idx].dot(latent_inters[idx]).dot(latent_varies[idx])
+        emb_row = embeddings[edge_type[0]]
+        emb_col = embeddings[edge_type[1]]
+        preds = expit(np.einsum(
+            'ej,jk,ek->e', emb_row[ep[:, 0]], kernel, emb_col[ep[:, 1]]))
+        preds_neg = expit(np.einsum(
+            'ej,jk,ek->e', emb_row[en[:, 0]], kernel, emb_col[en[:, 1]]))
+
+    if __debug__:
+        adj = adj_mats_orig[edge_type[:2]][edge_type[2]].tocsr()
+        assert np.all(adj[ep[:, 0], ep[:, 1]].A1 == 1), 'Problem 1'
+        assert np.all(adj[en[:, 0], en[:, 1]].A1 == 0), 'Problem 0'
+
+    # Fill one preallocated buffer per array instead of hstack temporaries
+    n_pos = len(preds)
+    n_all = n_pos + len(preds_neg)
+    preds_all = np.empty(n_all, dtype=np.float32)
+    preds_all[:n_pos] = preds
+    preds_all[n_pos:] = preds_neg
+    np.nan_to_num(preds_all, copy=False)
+    labels_all = np.empty(n_all, dtype=np.float32)
+    labels_all[:n_pos] = 1.
+    labels_all[n_pos:] = 0.
+
+    actual = list(range(n_pos))
+    predicted = np.argsort(-preds_all, kind='mergesort').tolist()
 
     roc_sc = metrics.roc_auc_score(labels_all, preds_all)
     aupr_sc = metrics.average_precision_score(labels_all, preds_all)
@@ -326,6 +392,7 @@ model = DecagonModel(
     nonzero_feat=nonzero_feat,
     edge_types=edge_types,
     decoders=edge_type2decoder,
+    use_identity_feat=feat[0] is not None,
 )
 
 print("Create optimizer")
@@ -343,7 +410,12 @@ with tf.name_scope('optimizer'):
     )
 
 print("Initialize session")
-sess = tf.Session()
+# CPU-only training: give the compute pool all cores and keep a small
+# pool for independent ops
+config = tf.ConfigProto(
+    intra_op_parallelism_threads=multiprocessing.cpu_count(),
+    inter_op_parallelism_threads=2)
+sess = tf.Session(config=config)
 sess.run(tf.global_variables_initializer())
 feed_dict = {}
 
@@ -354,17 +426,40 @@ feed_dict = {}
 ###########################################################
 
 print("Train model")
+
+# The adjacency tuples, feature tuples and dropout rate are invariant
+# across training steps; serialize that portion of the feed dict once and
+# merge the per-batch entries into a copy every step.
+static_feed = minibatch.update_feed_dict(
+    feed_dict=dict(),
+    dropout=FLAGS.dropout,
+    placeholders=placeholders)
+
+def _produce_minibatches(batch_queue):
+    """Prepare feed dicts one batch ahead of the training step."""
+    while not minibatch.end():
+        feed_dict = dict(static_feed)
+        feed_dict.update(minibatch.next_minibatch_feed_dict(placeholders=placeholders))
+        batch_queue.put((feed_dict, minibatch.current_edge_type_idx))
+    batch_queue.put(None)
+
 for epoch in range(FLAGS.epochs):
 
     minibatch.shuffle()
+
+    # Overlap feed-dict construction with sess.run: a producer thread keeps
+    # the next batch ready while the current one trains
+    batch_queue = queue.Queue(maxsize=2)
+    producer = threading.Thread(target=_produce_minibatches, args=(batch_queue,))
+    producer.daemon = True
+    producer.start()
+
     itr = 0
-    while not minibatch.end():
-        # Construct feed dictionary
-        feed_dict = minibatch.next_minibatch_feed_dict(placeholders=placeholders)
-        feed_dict = minibatch.update_feed_dict(
-            feed_dict=feed_dict,
-            dropout=FLAGS.dropout,
-            placeholders=placeholders)
+    while True:
+        item = batch_queue.get()
+        if item is None:
+            break
+        feed_dict, batch_edge_type_idx = item
 
         t = time.time()
 
@@ -376,7 +471,7 @@ for epoch in range(FLAGS.epochs):
         if itr % PRINT_PROGRESS_EVERY == 0:
             val_auc, val_auprc, val_apk = get_accuracy_scores(
                 minibatch.val_edges, minibatch.val_edges_false,
-                minibatch.idx2edge_type[minibatch.current_edge_type_idx])
+                minibatch.idx2edge_type[batch_edge_type_idx])
 
             print("Epoch:", "%04d" % (epoch + 1), "Iter:", "%04d" % (itr + 1), "Edge:", "%04d" % batch_edge_type,
                   "train_loss=", "{:.5f}".format(train_cost),
@@ -385,13 +480,22 @@ for epoch in range(FLAGS.epochs):
 
         itr += 1
 
+    producer.join()
+
 print("Optimization finished!")
 
-for et in range(num_edge_types):
-    roc_score, auprc_score, apk_score = get_accuracy_scores(
-        minibatch.test_edges, minibatch.test_edges_false, minibatch.idx2edge_type[et])
-    print("Edge type=", "[%02d, %02d, %02d]" % minibatch.idx2edge_type[et])
-    print("Edge type:", "%04d" % et, "Test AUROC score", "{:.5f}".format(roc_score))
-    print("Edge type:", "%04d" % et, "Test AUPRC score", "{:.5f}".format(auprc_score))
-    print("Edge type:", "%04d" % et, "Test AP@k score", "{:.5f}".format(apk_score))
-    print()
+# Sweep edge types grouped by (row, col) prefix; every score is computed
+# on the host from the single factors fetch above
+test_factors = fetch_prediction_factors()
+for i, j in sorted(edge_types):
+    for k in range(edge_types[i, j]):
+        edge_type = (i, j, k)
+        et = minibatch.edge_type2idx[edge_type]
+        roc_score, auprc_score, apk_score = get_accuracy_scores(
+            minibatch.test_edges, minibatch.test_edges_false, edge_type,
+            factors=test_factors)
+        print("Edge type=", "[%02d, %02d, %02d]" % edge_type)
+        print("Edge type:", "%04d" % et, "Test AUROC score", "{:.5f}".format(roc_score))
+        print("Edge type:", "%04d" % et, "Test AUPRC score", "{:.5f}".format(auprc_score))
+        print("Edge type:", "%04d" % et, "Test AP@k score", "{:.5f}".format(apk_score))
+        print()